@@ -13,7 +13,7 @@ import unittest
 from qiime2.sdk.plugin_manager import PluginManager
 from qiime2.core.testing.type import IntSequence1
 
-from ..usage_drivers import ReplayPythonUsage
+from ..usage_drivers import ReplayPythonUsage, build_header
 from ..replay import replay_provenance
 
 
@@ -186,3 +186,44 @@ class ReplayPythonUsageTests(unittest.TestCase):
         with open(out_fp) as fh:
             rendered = fh.read()
         self.assertRegex(rendered, exp)
+
+    def test_build_header_does_not_mutate_shared_text(self):
+        """
+        The copyright and how-to text are read once at import and shared by
+        every driver instance, so they must be immutable and mutating one
+        built header must not leak into the next.
+        """
+        copyright_lines = ReplayPythonUsage.copyright
+        how_to_lines = ReplayPythonUsage.how_to
+        self.assertIsInstance(copyright_lines, tuple)
+        self.assertIsInstance(how_to_lines, tuple)
+
+        header = build_header(
+            copyright=copyright_lines, extra_text=how_to_lines
+        )
+        header[:] = ['# mutated']
+        header.append('# also mutated')
+
+        header = build_header(
+            copyright=copyright_lines, extra_text=how_to_lines
+        )
+        rendered = '\n'.join(header)
+        self.assertNotIn('mutated', rendered)
+        self.assertIn('\n'.join(copyright_lines), rendered)
+        self.assertIn('\n'.join(how_to_lines), rendered)
+
+    def test_render_picks_up_imports_added_after_render(self):
+        """
+        render caches the sorted local imports; adding an import after a
+        non-flushing render must invalidate that cache.
+        """
+        use = ReplayPythonUsage()
+        use._update_imports(from_='qiime2', import_='Artifact')
+        rendered = use.render()
+        self.assertIn('from qiime2 import Artifact', rendered)
+        self.assertNotIn('import re', rendered)
+
+        use._update_imports(import_='re')
+        rendered = use.render()
+        self.assertIn('from qiime2 import Artifact', rendered)
+        self.assertIn('import re', rendered)
@@ -6,10 +6,12 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 from datetime import datetime
+from functools import lru_cache
 from importlib.metadata import metadata
-import pkg_resources
+from itertools import chain, zip_longest
+from pathlib import Path
 import textwrap
-from typing import Any, Callable, List
+from typing import Any, Callable, List, Optional
 
 from .parse import ProvDAG
 
@@ -20,11 +22,17 @@ from qiime2.sdk.usage import (
 )
 
 
+@lru_cache(maxsize=1)
+def _qiime2_version() -> str:
+    '''Returns the installed qiime2 version, read from metadata only once.'''
+    return metadata('qiime2')['Version']
+
+
 def build_header(
     shebang: str = '',
     boundary: str = '',
     copyright: str = '',
-    extra_text: List[str] = []
+    extra_text: Optional[List[str]] = None
 ) -> List[str]:
     '''
     Constructs the header contents for a replay script.
@@ -46,9 +54,8 @@ def build_header(
     list of str
         The constructed header lines.
     '''
-    qiime2_md = metadata('qiime2')
-    vzn = qiime2_md['Version']
-    ts = datetime.now()
+    vzn = _qiime2_version()
+    ts_str = datetime.now().strftime('%I:%M:%S %p on %d %b, %Y')
     header = []
 
     if shebang:
@@ -58,8 +65,7 @@ def build_header(
         header.append(boundary)
 
     header.extend([
-        f'# Auto-generated by qiime2 v.{vzn} at '
-        f'{ts.strftime("%I:%M:%S %p")} on {ts.strftime("%d %b, %Y")}',
+        f'# Auto-generated by qiime2 v.{vzn} at {ts_str}',
     ])
 
     if copyright:
@@ -94,14 +100,12 @@ def build_footer(dag: ProvDAG, boundary: str) -> List[str]:
         The constructed footer lines as a list of strings.
     '''
     footer = []
-    pairs = []
     uuids = sorted(dag._parsed_artifact_uuids)
     # two UUIDs fit on a line
-    for idx in range(0, u_len := len(uuids), 2):
-        if idx == u_len - 1:
-            pairs.append(f'# {uuids[idx]}')
-        else:
-            pairs.append(f'# {uuids[idx]} \t {uuids[idx + 1]}')
+    pairs = [
+        f'# {a} \t {b}' if b is not None else f'# {a}'
+        for a, b in zip_longest(uuids[::2], uuids[1::2])
+    ]
 
     footer.append(boundary)
     footer.append(
@@ -113,17 +117,59 @@ def build_footer(dag: ProvDAG, boundary: str) -> List[str]:
     return footer
 
 
+_ASSETS_DIR = Path(__file__).parent / 'assets'
+
+
+# read once at import; tuples so that callers can't mutate shared header text
+_COPYRIGHT_LINES = tuple(
+    (_ASSETS_DIR / 'copyright_note.txt').read_text(
+        encoding='utf-8'
+    ).split('\n')
+)
+_HOWTO_LINES = tuple(
+    (_ASSETS_DIR / 'python_howto.txt').read_text(
+        encoding='utf-8'
+    ).split('\n')
+)
+
+
+class _RawReprName:
+    # allows us to repr col name without enclosing quotes
+    # (as in qiime2.qiime2.plugins.ArtifactAPIUsageVariable)
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return self.value
+
+
+_FIXME_UNKNOWN_PARAM = (
+    '# FIXME: The following parameter name was not found in '
+    'your current\n    # QIIME 2 environment. This may occur '
+    'when the plugin version you have\n    # installed does '
+    'not match the version used in the original analysis.\n '
+    ' # Please see the docs and correct the parameter name '
+    'before running.\n'
+)
+_SAVE_RESULTS_COMMENT = (
+    '# SAVE: comment out the following with \'# \' to skip saving '
+    'Results to disk'
+)
+
+
 class ReplayPythonUsage(ArtifactAPIUsage):
     shebang = '#!/usr/bin/env python'
     header_boundary = '# ' + ('-' * 77)
-    copyright = pkg_resources.resource_string(
-        'qiime2.core.archive.provenance_lib',
-        'assets/copyright_note.txt'
-    ).decode('utf-8').split('\n')
-    how_to = pkg_resources.resource_string(
-        'qiime2.core.archive.provenance_lib',
-        'assets/python_howto.txt'
-    ).decode('utf-8').split('\n')
+    copyright = _COPYRIGHT_LINES
+    how_to = _HOWTO_LINES
+    _wrapper = textwrap.TextWrapper(
+        width=79,
+        break_long_words=False,
+        initial_indent='# ',
+        subsequent_indent='# '
+    )
 
     def __init__(
         self,
@@ -157,6 +203,8 @@ class ReplayPythonUsage(ArtifactAPIUsage):
             Whether to reset self.global_imports to an empty set.
         '''
         self.local_imports = set()
+        self._sorted_imports_cache = None
+        self._imports_dirty = True
         self.header = []
         self.recorder = []
         self.footer = []
@@ -164,6 +212,17 @@ class ReplayPythonUsage(ArtifactAPIUsage):
         if reset_global_imports:
             self.global_imports = set()
 
+    def _update_imports(self, import_, from_=None, as_=None):
+        '''
+        Extends the parent method to invalidate the sorted imports cached by
+        `render`.
+
+        `local_imports` must only be changed through this method; mutating it
+        directly leaves `render` with stale imports.
+        '''
+        super()._update_imports(import_, from_=from_, as_=as_)
+        self._imports_dirty = True
+
     def _template_action(
         self, action: Action, input_opts: UsageInputs, variables: UsageOutputs
     ):
@@ -186,6 +245,8 @@ class ReplayPythonUsage(ArtifactAPIUsage):
             The UsageOutputs object for the action.
         '''
         action_f = action.get_action()
+        asdict = variables._asdict()
+        named = [(k, v.to_interface_name()) for k, v in asdict.items()]
         if (
             len(variables) > self.action_collection_size
             or len(action_f.signature.outputs) > 5
@@ -200,19 +261,12 @@ class ReplayPythonUsage(ArtifactAPIUsage):
             f'{output_vars} = {plugin_id}_actions.{action_id}('
         ]
 
-        all_inputs = (list(action_f.signature.inputs.keys()) +
-                      list(action_f.signature.parameters.keys()))
+        all_inputs = (frozenset(action_f.signature.inputs) |
+                      frozenset(action_f.signature.parameters))
         for k, v in input_opts.items():
             line = ''
             if k not in all_inputs:
-                line = self.INDENT + (
-                    '# FIXME: The following parameter name was not found in '
-                    'your current\n    # QIIME 2 environment. This may occur '
-                    'when the plugin version you have\n    # installed does '
-                    'not match the version used in the original analysis.\n '
-                    ' # Please see the docs and correct the parameter name '
-                    'before running.\n'
-                )
+                line = self.INDENT + _FIXME_UNKNOWN_PARAM
             line += self._template_input(k, v)
             lines.append(line)
 
@@ -220,20 +274,14 @@ class ReplayPythonUsage(ArtifactAPIUsage):
 
         if (
             len(variables) > self.action_collection_size
-            or len(action.get_action().signature.outputs) > 5
+            or len(action_f.signature.outputs) > 5
         ):
-            for k, v in variables._asdict().items():
-                interface_name = v.to_interface_name()
-                lines.append('%s = action_results.%s' % (interface_name, k))
+            for k, interface_name in named:
+                lines.append(f'{interface_name} = action_results.{k}')
 
-        lines.append(
-            '# SAVE: comment out the following with \'# \' to skip saving '
-            'Results to disk'
-        )
-        for k, v in variables._asdict().items():
-            interface_name = v.to_interface_name()
-            lines.append(
-                '%s.save(\'%s\')' % (interface_name, interface_name,))
+        lines.append(_SAVE_RESULTS_COMMENT)
+        for _, interface_name in named:
+            lines.append(f"{interface_name}.save('{interface_name}')")
 
         lines.append('')
         self._add(lines)
@@ -258,16 +306,15 @@ class ReplayPythonUsage(ArtifactAPIUsage):
         str
             The templated output variables names as a comma-separated string.
         '''
-        output_vars = []
         action_f = action.get_action()
+        asdict = variables._asdict()
 
         # need to coax the outputs into the correct order for unpacking
-        for output in action_f.signature.outputs:
-            try:
-                variable = getattr(variables, output)
-                output_vars.append(str(variable.to_interface_name()))
-            except AttributeError:
-                output_vars.append('_')
+        output_vars = [
+            str(asdict[output].to_interface_name()) if output in asdict
+            else '_'
+            for output in action_f.signature.outputs
+        ]
 
         if len(output_vars) == 1:
             output_vars.append('')
@@ -343,13 +390,14 @@ class ReplayPythonUsage(ArtifactAPIUsage):
             self, name, semantic_type, variable, view_type=view_type
         )
 
+        indent = self.INDENT
         interface_name = imported_var.to_interface_name()
-        import_fp = self.repr_raw_variable_name('<your data here>')
+        import_fp = _RawReprName('<your data here>')
 
         lines = [
-            '%s = Artifact.import_data(' % (interface_name,),
-            self.INDENT + '%r,' % (semantic_type,),
-            self.INDENT + '%r,' % (import_fp,),
+            f'{interface_name} = Artifact.import_data(',
+            f'{indent}{semantic_type!r},',
+            f'{indent}{import_fp!r},',
         ]
 
         if view_type is not None:
@@ -369,13 +417,13 @@ class ReplayPythonUsage(ArtifactAPIUsage):
             else:
                 view_type = repr(view_type)
 
-            lines.append(self.INDENT + '%s,' % (view_type,))
+            lines.append(f'{indent}{view_type},')
 
         lines.extend([
             ')',
             '# SAVE: comment out the following with \'# \' to skip saving this'
             ' Result to disk',
-            '%s.save(\'%s\')' % (interface_name, interface_name,),
+            f"{interface_name}.save('{interface_name}')",
             ''
         ])
 
@@ -384,14 +432,7 @@ class ReplayPythonUsage(ArtifactAPIUsage):
 
         return imported_var
 
-    class repr_raw_variable_name:
-        # allows us to repr col name without enclosing quotes
-        # (as in qiime2.qiime2.plugins.ArtifactAPIUsageVariable)
-        def __init__(self, value):
-            self.value = value
-
-        def __repr__(self):
-            return self.value
+    repr_raw_variable_name = _RawReprName
 
     def comment(self, line: str):
         '''
@@ -402,14 +443,7 @@ class ReplayPythonUsage(ArtifactAPIUsage):
         line : str
             The comment to be rendered.
         '''
-        LINE_LEN = 79
-        lines = textwrap.wrap(
-            line,
-            LINE_LEN,
-            break_long_words=False,
-            initial_indent='# ',
-            subsequent_indent='# '
-        )
+        lines = self._wrapper.wrap(line)
         lines.append('')
         self._add(lines)
 
@@ -428,7 +462,10 @@ class ReplayPythonUsage(ArtifactAPIUsage):
         str
             The rendered string of python code.
         '''
-        sorted_imps = sorted(self.local_imports)
+        if self._imports_dirty:
+            self._sorted_imports_cache = sorted(self.local_imports)
+            self._imports_dirty = False
+        sorted_imps = self._sorted_imports_cache
         if self.header:
             self.header = self.header + ['']
         if self.footer:
@@ -436,7 +473,7 @@ class ReplayPythonUsage(ArtifactAPIUsage):
         if sorted_imps:
             sorted_imps = sorted_imps + ['']
         rendered = '\n'.join(
-            self.header + sorted_imps + self.recorder + self.footer
+            chain(self.header, sorted_imps, self.recorder, self.footer)
         )
         if flush:
             self._reset_state()